@@ -10,14 +10,81 @@ from typing import Annotated, Optional
 from pydantic import Field
 from pydantic import BaseModel
 from enum import Enum
-import subprocess
+from collections import deque
+from itertools import takewhile
+import asyncio
+import getpass
+import hashlib
 import os
 import json
+import re
+import shlex
+import tempfile
+import time
+from xml.etree import ElementTree
 from mcp.shared.exceptions import McpError
 
+# orjson parses the (often multi-MB) simctl JSON several times faster when it happens to be installed
+try:
+    from orjson import loads as _json_loads  # pyright: ignore[reportMissingImports]
+except ImportError:
+    _json_loads = json.loads
+
 # Global default scheme configuration
 default_scheme: Optional[str] = None
 
+# Schemes per absolute project path, stored with the project mtime (ns) they were read at
+_SCHEMES_CACHE: dict[str, tuple[int, list[str]]] = {}
+
+# Per-user cache directory, persisted scheme listings survive server restarts
+_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mcpxcodebuild")
+_SCHEMES_CACHE_FILE = os.path.join(_CACHE_DIR, "schemes.json")
+# Whether the persisted scheme listings have been read into _SCHEMES_CACHE yet
+_SCHEMES_CACHE_LOADED = False
+
+# Xcode project per absolute folder: (mtimes of the directories from the folder down to the project's parent,
+# project path, project name relative to the folder, project type)
+_PROJECT_CACHE: dict[str, tuple[tuple[float, ...], str, str, str]] = {}
+
+# Seconds a simctl device listing is reused for, the clear_cache tool drops it early
+try:
+    _SIMCTL_TTL = float(os.environ.get("MCPXCODEBUILD_SIM_TTL", "300"))
+except ValueError:
+    # A malformed value shouldn't keep the server from starting
+    _SIMCTL_TTL = 300.0
+
+# Available iOS simulator destinations indexed by (name, iOS version), with the monotonic time they were listed at
+_SIMCTL_CACHE: Optional[tuple[float, dict[tuple[Optional[str], Optional[str]], str]]] = None
+
+# Lines of output returned by the "all" filter
+MAX_OUTPUT_LINES = 200
+
+# Case-insensitive diagnostics matchers, their patterns are also valid grep -E expressions
+_ERROR_RE = re.compile("error:", re.IGNORECASE)
+_WARNING_RE = re.compile("warning:", re.IGNORECASE)
+_ERROR_OR_WARNING_RE = re.compile("error:|warning:", re.IGNORECASE)
+
+# What xcodebuild says when asked for a scheme the project doesn't have, grep lets it through for every filter
+_UNKNOWN_SCHEME_MESSAGE = "does not contain a scheme named"
+
+# Build independent targets in parallel on every core, MCPXCODEBUILD_PARALLEL=0 opts out
+if os.environ.get("MCPXCODEBUILD_PARALLEL", "1") != "0":
+    _PARALLEL_FLAGS = ["-parallelizeTargets", "-jobs", str(os.cpu_count() or 4)]
+else:
+    _PARALLEL_FLAGS = []
+
+# Opt in to keeping DerivedData and SPM checkouts in our own per-folder cache, MCPXCODEBUILD_PIN_DERIVED_DATA=1
+_PIN_DERIVED_DATA = os.environ.get("MCPXCODEBUILD_PIN_DERIVED_DATA", "0") == "1"
+
+# xcodebuild prints whole compiler invocations on one line, well past asyncio's 64 KiB default
+_STREAM_LIMIT = 16 * 1024 * 1024
+
+# Bundle suffixes of the Xcode containers xcodebuild can build
+_XCODE_SUFFIXES = (".xcworkspace", ".xcodeproj")
+
+# Directories that never hold the project we're after but can be huge to walk (hidden ones are skipped too)
+_SKIPPED_DIRS = {"node_modules", "Pods", "Carthage", "DerivedData", "build"}
+
 class OutputFilter(str, Enum):
     ALL = "all"
     ERRORS_ONLY = "errors_only"
@@ -25,86 +92,301 @@ class OutputFilter(str, Enum):
     ERRORS_AND_WARNINGS = "errors_and_warnings"
     STRING_MATCH = "string_match"
 
-def find_xcode_project():
-    for root, dirs, files in os.walk("."):
-        dirs.sort(reverse = True)
-        for dir in dirs:
-            if dir.endswith(".xcworkspace") or dir.endswith(".xcodeproj"):
-                return os.path.join(root, dir)
+def _scan_one(path: str) -> tuple[Optional[tuple[str, str]], list[str]]:
+    """Scan a single directory, returns ((project path, project type) found in it, subdirectories worth descending into)"""
+    workspaces, projects, subdirs = [], [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                # One C-level suffix test for the common case of an entry that is neither
+                if entry.name.endswith(_XCODE_SUFFIXES):
+                    if entry.is_dir():
+                        (workspaces if entry.name.endswith(".xcworkspace") else projects).append(entry.path)
+                elif (not entry.name.startswith(".")
+                        and entry.name not in _SKIPPED_DIRS
+                        and entry.is_dir(follow_symlinks=False)):
+                    subdirs.append(entry.path)
+    except OSError:
+        return None, []
+
+    # Prefer a workspace over a project at the same level, like xcodebuild does,
+    # and the last name in sort order among several of a kind
+    if workspaces:
+        return (max(workspaces), "-workspace"), []
+    if projects:
+        return (max(projects), "-project"), []
+    return None, sorted(subdirs, reverse=True)
+
+def find_xcode_project(root: str, max_depth: int = 3) -> Optional[tuple[str, str]]:
+    """Find the Xcode project under root, returns (project path, "-workspace" or "-project")"""
+    # Breadth first, so a project in the folder itself wins over nested ones,
+    # and bounded since projects almost always sit at the top or a level or two below
+    pending = deque([(root, 0)])
+    while pending:
+        path, depth = pending.popleft()
+        project, subdirs = _scan_one(path)
+        if project:
+            return project
+        if depth < max_depth:
+            pending.extend((subdir, depth + 1) for subdir in subdirs)
     return None
 
-def get_available_schemes(project_type: str, project_name: str) -> list[str]:
-    schemes_result = subprocess.run(["xcodebuild",
-                                    "-list",
-                                    project_type,
-                                    project_name],
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE,
-                                    check=False).stdout.decode("utf-8")
-    
-    schemes_lines = schemes_result.splitlines()
-    schemes = []
-    in_schemes_section = False
-    for line in schemes_lines:
-        if "Schemes:" in line:
-            in_schemes_section = True
+def _search_path_mtimes(folder: str, project_path: str) -> Optional[tuple[float, ...]]:
+    """Modification times of the directories from the folder down to the project's parent, None if one is gone"""
+    directory = os.path.dirname(project_path)
+    directories = [directory]
+    while directory != folder and len(directory) > len(folder):
+        directory = os.path.dirname(directory)
+        directories.append(directory)
+    try:
+        return tuple(os.stat(directory).st_mtime for directory in directories)
+    except OSError:
+        return None
+
+def _resolve_project(folder: str) -> Optional[tuple[str, str, str]]:
+    """Locate the folder's Xcode project, returns (project path, project name relative to the folder, project type)"""
+    folder = os.path.abspath(folder)
+
+    # A project appearing next to the cached one (e.g. a workspace after `pod install`, also in a nested ios/ folder)
+    # bumps the mtime of its directory, so every directory on the way down to it is checked
+    cached = _PROJECT_CACHE.get(folder)
+    if (cached and os.path.isdir(cached[1])
+            and cached[0] == _search_path_mtimes(folder, cached[1])):
+        return cached[1:]
+
+    project = find_xcode_project(folder)
+    if not project:
+        _PROJECT_CACHE.pop(folder, None)
+        return None
+    project_path, project_type = project
+    mtimes = _search_path_mtimes(folder, project_path)
+    if mtimes is None:
+        _PROJECT_CACHE.pop(folder, None)
+        return None
+    # xcodebuild runs in the folder, so name the project relative to it
+    project_name = os.path.relpath(project_path, folder)
+    _PROJECT_CACHE[folder] = (mtimes, project_path, project_name, project_type)
+    return project_path, project_name, project_type
+
+def _workspace_projects(workspace_path: str) -> list[str]:
+    """Paths of the projects referenced by a workspace's contents.xcworkspacedata"""
+    base_dir = os.path.dirname(os.path.abspath(workspace_path))
+    try:
+        root = ElementTree.parse(os.path.join(workspace_path, "contents.xcworkspacedata")).getroot()
+    except (OSError, ElementTree.ParseError):
+        return []
+
+    projects = []
+    def visit(element, group_dir: str):
+        for child in element:
+            # Locations look like "group:App/App.xcodeproj" or "container:App.xcodeproj"
+            kind, _, location = child.get("location", "").partition(":")
+            if kind == "group":
+                path = os.path.join(group_dir, location)
+            elif kind == "container":
+                path = os.path.join(base_dir, location)
+            elif kind == "absolute":
+                path = location
+            else:
+                path = group_dir
+            if child.tag == "Group":
+                visit(child, path)
+            elif child.tag == "FileRef" and path.endswith(".xcodeproj"):
+                projects.append(path)
+    visit(root, base_dir)
+    return projects
+
+def _scheme_dirs(container_path: str) -> list[str]:
+    """Shared and current user's xcschemes directories of a project or workspace"""
+    # xcodebuild ignores other users' xcuserdata, even when it got committed by accident
+    return [os.path.join(container_path, "xcshareddata", "xcschemes"),
+            os.path.join(container_path, "xcuserdata", f"{getpass.getuser()}.xcuserdatad", "xcschemes")]
+
+def _schemes_from_disk(project_path: str) -> list[str]:
+    """Read scheme names from the .xcscheme files of the project (and workspace members)"""
+    containers = [project_path]
+    if project_path.endswith(".xcworkspace"):
+        containers += _workspace_projects(project_path)
+
+    schemes = set()
+    for container in containers:
+        for scheme_dir in _scheme_dirs(container):
+            try:
+                with os.scandir(scheme_dir) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(".xcscheme"):
+                            schemes.add(entry.name[:-len(".xcscheme")])
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+    return sorted(schemes, key=str.lower)
+
+def _project_mtime(project_path: str) -> int:
+    """Latest modification time (ns) of the files xcodebuild derives autogenerated schemes from"""
+    if project_path.endswith(".xcworkspace"):
+        paths = [os.path.join(project_path, "contents.xcworkspacedata")]
+        paths += [os.path.join(project, "project.pbxproj") for project in _workspace_projects(project_path)]
+    else:
+        paths = [os.path.join(project_path, "project.pbxproj")]
+
+    mtime = 0
+    for path in paths:
+        try:
+            mtime = max(mtime, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
             continue
-        if in_schemes_section:
-            scheme = line.strip()
-            if scheme:
-                schemes.append(scheme)
+    return mtime
+
+def _load_schemes_cache():
+    """Fill _SCHEMES_CACHE from the copy persisted by a previous server process, only read once per process"""
+    global _SCHEMES_CACHE_LOADED
+    if _SCHEMES_CACHE_LOADED:
+        return
+    _SCHEMES_CACHE_LOADED = True
+    try:
+        with open(_SCHEMES_CACHE_FILE, encoding="utf-8") as cache_file:
+            persisted = json.load(cache_file)
+        # Valid JSON of the wrong shape is as unusable as a corrupt file
+        if not isinstance(persisted, dict):
+            return
+        for project_path, (mtime, schemes) in persisted.items():
+            _SCHEMES_CACHE.setdefault(project_path, (mtime, schemes))
+    except (OSError, ValueError, TypeError):
+        pass
+
+def _save_schemes_cache():
+    """Persist _SCHEMES_CACHE, written to a temporary file first so readers never see a partial one"""
+    # Don't carry projects that have since been moved or deleted from one server process to the next
+    for project_path in [path for path in _SCHEMES_CACHE if not os.path.exists(path)]:
+        del _SCHEMES_CACHE[project_path]
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        cache_file = tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=_CACHE_DIR, delete=False)
+    except OSError:
+        return
+    try:
+        with cache_file:
+            json.dump(_SCHEMES_CACHE, cache_file)
+        os.replace(cache_file.name, _SCHEMES_CACHE_FILE)
+    except OSError:
+        try:
+            os.unlink(cache_file.name)
+        except OSError:
+            pass
+
+def _cached_schemes(project_path: str) -> Optional[list[str]]:
+    """The remembered xcodebuild -list result for the project, None if there is none or it is stale"""
+    _load_schemes_cache()
+    cached = _SCHEMES_CACHE.get(os.path.abspath(project_path))
+    if cached and cached[0] == _project_mtime(project_path):
+        return cached[1]
+    return None
+
+async def _listed_schemes(project_type: str, project_path: str, use_cache: bool = True) -> list[str]:
+    """Schemes reported by xcodebuild -list, including the autogenerated ones that have no scheme file"""
+    cached = _cached_schemes(project_path) if use_cache else None
+    if cached:
+        return cached
+    cache_key = os.path.abspath(project_path)
+    mtime = _project_mtime(project_path)
+
+    schemes_result = (await _run(["xcodebuild", "-list", project_type, project_path])).decode("utf-8", "replace")
     
+    # Skip past the "Schemes:" header, then take names up to the blank line that ends the section
+    schemes_lines = iter(schemes_result.splitlines())
+    next((line for line in schemes_lines if "Schemes:" in line), None)
+    schemes = list(takewhile(bool, (line.strip() for line in schemes_lines)))
+    
+    # Don't remember a failed listing, xcodebuild may just not be ready yet
+    if schemes:
+        _SCHEMES_CACHE[cache_key] = (mtime, schemes)
+        _save_schemes_cache()
     return schemes
 
-def find_scheme(project_type: str, project_name: str, requested_scheme: Optional[str] = None) -> str:
+async def get_available_schemes(project_type: str, project_path: str) -> list[str]:
+    schemes = _schemes_from_disk(project_path)
+    if schemes:
+        return schemes
+
+    # No scheme files on disk (e.g. autogenerated Swift package schemes), ask xcodebuild
+    return await _listed_schemes(project_type, project_path)
+
+async def missing_scheme(project_type: str, project_path: str, scheme: str) -> Optional[list[str]]:
+    """None if the scheme exists, otherwise the available schemes to suggest instead"""
+    disk_schemes = _schemes_from_disk(project_path)
+    if scheme in disk_schemes:
+        return None
+
+    # Unshared schemes on a fresh clone and Swift package schemes only show up in xcodebuild -list
+    listed_schemes = await _listed_schemes(project_type, project_path)
+    if scheme in listed_schemes:
+        return None
+    return list(dict.fromkeys(disk_schemes + listed_schemes))
+
+async def find_scheme(project_type: str, project_path: str, requested_scheme: Optional[str] = None) -> str:
     global default_scheme
-    available_schemes = get_available_schemes(project_type, project_name)
     
     # Priority: requested_scheme > default_scheme > first available
     scheme_to_use = requested_scheme or default_scheme
     
     if scheme_to_use:
-        if scheme_to_use in available_schemes:
-            return scheme_to_use
-        else:
-            raise ValueError(f"Scheme '{scheme_to_use}' not found. Available schemes: {', '.join(available_schemes)}")
+        # A scheme file on disk or a cached xcodebuild -list result settles it. The cache doesn't notice new
+        # Swift package products, so a scheme missing from it is only rejected once a fresh listing agrees.
+        # Without a cached listing it is used as is and xcodebuild reports an unknown one.
+        disk_schemes = _schemes_from_disk(project_path)
+        if scheme_to_use not in disk_schemes:
+            cached_schemes = _cached_schemes(project_path)
+            if cached_schemes and scheme_to_use not in cached_schemes:
+                listed_schemes = await _listed_schemes(project_type, project_path, use_cache=False)
+                if listed_schemes and scheme_to_use not in listed_schemes:
+                    available_schemes = list(dict.fromkeys(disk_schemes + listed_schemes))
+                    raise ValueError(f"Scheme '{scheme_to_use}' not found. Available schemes: {', '.join(available_schemes)}")
+        return scheme_to_use
     
+    available_schemes = await get_available_schemes(project_type, project_path)
     if available_schemes:
         return available_schemes[0]
     else:
         return ""
 
-def filter_build_output(lines: list[str], output_filter: OutputFilter, filter_string: Optional[str] = None) -> str:
-    """Filter xcodebuild output based on the specified filter type"""
+def filter_build_output(lines: list[str], output_filter: OutputFilter, filter_string: Optional[str] = None, total_lines: Optional[int] = None) -> str:
+    """Filter xcodebuild output based on the specified filter type
     
-    if output_filter == OutputFilter.ALL:
+    `total_lines` is the length of the whole output when `lines` only holds its tail.
+    """
+    
+    if output_filter == OutputFilter.STRING_MATCH and not filter_string:
+        raise ValueError("filter_string is required when output_filter is 'string_match'")
+    
+    if not lines:
+        # Nothing to filter, e.g. a no-op build or nothing got past grep
+        filtered_lines = []
+    elif output_filter == OutputFilter.ALL:
         # Return all output but with size limits to prevent overwhelming AI agents
-        MAX_LINES = 200
-        if len(lines) > MAX_LINES:
+        if total_lines is None:
+            total_lines = len(lines)
+        if total_lines > MAX_OUTPUT_LINES:
             summary_lines = [
-                f"[Output truncated - showing last {MAX_LINES} lines of {len(lines)} total lines]",
+                f"[Output truncated - showing last {MAX_OUTPUT_LINES} lines of {total_lines} total lines]",
                 ""
             ]
-            filtered_lines = summary_lines + lines[-MAX_LINES:]
+            filtered_lines = summary_lines + lines[-MAX_OUTPUT_LINES:]
         else:
             filtered_lines = lines
-    elif output_filter == OutputFilter.ERRORS_ONLY:
-        # Only lines containing "error:"
-        filtered_lines = [line for line in lines if "error:" in line.lower()]
-    elif output_filter == OutputFilter.WARNINGS_ONLY:
-        # Only lines containing "warning:"
-        filtered_lines = [line for line in lines if "warning:" in line.lower()]
-    elif output_filter == OutputFilter.ERRORS_AND_WARNINGS:
-        # Lines containing either "error:" or "warning:"
-        filtered_lines = [line for line in lines if "error:" in line.lower() or "warning:" in line.lower()]
-    elif output_filter == OutputFilter.STRING_MATCH:
-        # Lines containing the specified string
-        if not filter_string:
-            raise ValueError("filter_string is required when output_filter is 'string_match'")
-        filtered_lines = [line for line in lines if filter_string.lower() in line.lower()]
     else:
-        # Default to errors and warnings if unknown filter
-        filtered_lines = [line for line in lines if "error:" in line.lower() or "warning:" in line.lower()]
+        # Pick the matcher once, the compiled patterns avoid lowercasing every line
+        if output_filter == OutputFilter.ERRORS_ONLY:
+            # Only lines containing "error:"
+            search = _ERROR_RE.search
+        elif output_filter == OutputFilter.WARNINGS_ONLY:
+            # Only lines containing "warning:"
+            search = _WARNING_RE.search
+        elif output_filter == OutputFilter.STRING_MATCH and filter_string:
+            # Lines containing the specified string
+            search = re.compile(re.escape(filter_string), re.IGNORECASE).search
+        else:
+            # Lines containing either "error:" or "warning:", also the default for unknown filters
+            search = _ERROR_OR_WARNING_RE.search
+        filtered_lines = [line for line in lines if search(line)]
     
     if not filtered_lines:
         if output_filter == OutputFilter.ERRORS_ONLY:
@@ -120,45 +402,165 @@ def filter_build_output(lines: list[str], output_filter: OutputFilter, filter_st
     
     return "\n".join(filtered_lines)
 
-def find_available_simulator() -> str:
-    devices_result = subprocess.run(["xcrun", "simctl", "list", "devices", "--json"], stdout=subprocess.PIPE, check=False)
-    devices_json = json.loads(devices_result.stdout.decode("utf-8"))
+def _grep_command(output_filter: OutputFilter, filter_string: Optional[str] = None) -> Optional[list[str]]:
+    """grep invocation that pre-filters xcodebuild output for the filter, None when every line is needed
+
+    -a keeps grep from treating output with invalid UTF-8 as binary and dropping the matching lines.
+    """
+    if output_filter == OutputFilter.ALL:
+        return None
+    elif output_filter == OutputFilter.ERRORS_ONLY:
+        pattern = _ERROR_RE.pattern
+    elif output_filter == OutputFilter.WARNINGS_ONLY:
+        pattern = _WARNING_RE.pattern
+    elif output_filter == OutputFilter.STRING_MATCH:
+        if not filter_string:
+            return None
+        # Fixed string match, the user's text must not be interpreted as a regex
+        return ["grep", "-a", "-i", "-F", "-e", filter_string, "-e", _UNKNOWN_SCHEME_MESSAGE]
+    else:
+        pattern = _ERROR_OR_WARNING_RE.pattern
+    return ["grep", "-a", "-i", "-E", "-e", pattern, "-e", _UNKNOWN_SCHEME_MESSAGE]
+
+def _terminate(process: asyncio.subprocess.Process):
+    """Ask a child process to stop, if it is still running"""
+    if process.returncode is None:
+        try:
+            process.terminate()
+        except ProcessLookupError:
+            pass
+
+async def _run(command: list[str], cwd: Optional[str] = None) -> bytes:
+    """Run a command without blocking the event loop and return its stdout"""
+    process = await asyncio.create_subprocess_exec(*command, cwd=cwd,
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.DEVNULL)
+    try:
+        stdout, _ = await process.communicate()
+    except asyncio.CancelledError:
+        _terminate(process)
+        raise
+    return stdout
+
+async def run_xcodebuild(command: list[str], cwd: str, output_filter: OutputFilter, filter_string: Optional[str] = None) -> tuple[int, str, bool]:
+    """Run xcodebuild in `cwd` and filter its merged stdout/stderr while it streams
+
+    Returns (exit code, filtered output, whether xcodebuild reported an unknown scheme), the latter is
+    detected before filtering so it isn't lost when the filter drops the message.
+    """
+    grep_command = _grep_command(output_filter, filter_string)
+    if grep_command:
+        # grep drops the non-matching lines before Python ever reads them
+        read_fd, write_fd = os.pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(*command, cwd=cwd,
+                                                           stdout=write_fd,
+                                                           stderr=asyncio.subprocess.STDOUT)
+            try:
+                grep = await asyncio.create_subprocess_exec(*grep_command,
+                                                            stdin=read_fd,
+                                                            stdout=asyncio.subprocess.PIPE,
+                                                            limit=_STREAM_LIMIT)
+            except BaseException:
+                _terminate(process)
+                raise
+        finally:
+            # The child processes hold their own copies of the pipe ends
+            os.close(read_fd)
+            os.close(write_fd)
+        assert grep.stdout is not None
+        output = grep.stdout
+    else:
+        grep = None
+        process = await asyncio.create_subprocess_exec(*command, cwd=cwd,
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.STDOUT,
+                                                       limit=_STREAM_LIMIT)
+        assert process.stdout is not None
+        output = process.stdout
+
+    # Only keep what the filter can return: the tail for "all", otherwise the lines grep let through.
+    # Lines stay raw bytes until then, so the ones a long build pushes out of the tail are never decoded
+    kept_lines = deque(maxlen=MAX_OUTPUT_LINES) if output_filter == OutputFilter.ALL else []
+    total_lines = 0
+    unknown_scheme = False
+    unknown_scheme_message = _UNKNOWN_SCHEME_MESSAGE.encode()
+    try:
+        async for line in output:
+            kept_lines.append(line)
+            total_lines += 1
+            if unknown_scheme_message in line:
+                unknown_scheme = True
+
+        if grep:
+            await grep.wait()
+        returncode = await process.wait()
+    finally:
+        # Don't leave a multi-minute build running behind a cancelled or failed tool call
+        _terminate(process)
+        if grep:
+            _terminate(grep)
+    decoded_lines = [line.decode("utf-8", "replace").rstrip("\r\n") for line in kept_lines]
+    return returncode, filter_build_output(decoded_lines, output_filter, filter_string, total_lines), unknown_scheme
+
+async def _simctl_devices(ttl: float = _SIMCTL_TTL) -> dict[tuple[Optional[str], Optional[str]], str]:
+    """Available iOS simulator destinations keyed by (name, iOS version), refreshed at most every `ttl` seconds
     
-    for runtime_id, devices in devices_json["devices"].items():
-        if "iOS" in runtime_id:
-            for device in devices:
-                if device["isAvailable"]:
-                    # Extract the exact OS version from the runtime ID
-                    # Format: com.apple.CoreSimulator.SimRuntime.iOS-18-3-1 -> 18.3.1
-                    ios_version = runtime_id.split("iOS-")[-1].replace("-", ".")
-                    return f'platform=iOS Simulator,name={device["name"]},OS={ios_version}'
-    return ""
-
-def build_destination(simulator_name: Optional[str] = None, ios_version: Optional[str] = None) -> str:
+    Either part of the key may be None to get the first simulator matching only the other one.
+    """
+    global _SIMCTL_CACHE
+    now = time.monotonic()
+    if _SIMCTL_CACHE and now - _SIMCTL_CACHE[0] < ttl:
+        return _SIMCTL_CACHE[1]
+
+    # Both parsers decode the UTF-8 bytes themselves, no need for an intermediate str
+    devices_json = _json_loads(await _run(["xcrun", "simctl", "list", "devices", "--json"]))
+
+    # Extract the exact OS version from each iOS runtime ID
+    # Format: com.apple.CoreSimulator.SimRuntime.iOS-18-3-1 -> 18.3.1
+    runtimes = [(runtime_id.rsplit(".", 1)[-1].removeprefix("iOS-").replace("-", "."), devices)
+                for runtime_id, devices in devices_json["devices"].items()
+                if "iOS" in runtime_id]
+    # Newest runtime first, so partial and auto-detected lookups pick the most recent iOS
+    runtimes.sort(key=lambda runtime: tuple(int(part) if part.isdigit() else 0 for part in runtime[0].split(".")),
+                  reverse=True)
+
+    destinations = {}
+    for ios_version, devices in runtimes:
+        for device in devices:
+            if device["isAvailable"]:
+                destination = f'platform=iOS Simulator,name={device["name"]},OS={ios_version}'
+                # Normalize the runtime string once per refresh and index every lookup shape
+                for key in ((device["name"], ios_version), (device["name"], None), (None, ios_version), (None, None)):
+                    destinations.setdefault(key, destination)
+
+    _SIMCTL_CACHE = (now, destinations)
+    return destinations
+
+def clear_caches():
+    """Forget every cached project location, scheme listing and simulator list"""
+    global _SIMCTL_CACHE
+    _SIMCTL_CACHE = None
+    _PROJECT_CACHE.clear()
+    _SCHEMES_CACHE.clear()
+    try:
+        os.remove(_SCHEMES_CACHE_FILE)
+    except OSError:
+        pass
+
+async def find_available_simulator() -> str:
+    return (await _simctl_devices()).get((None, None), "")
+
+async def build_destination(simulator_name: Optional[str] = None, ios_version: Optional[str] = None) -> str:
     """Build the destination string for xcodebuild command"""
     if simulator_name and ios_version:
         # Use provided simulator name and iOS version
         return f'platform=iOS Simulator,name={simulator_name},OS={ios_version}'
     elif simulator_name or ios_version:
         # If only one is provided, we need to find a matching simulator
-        devices_result = subprocess.run(["xcrun", "simctl", "list", "devices", "--json"], stdout=subprocess.PIPE, check=False)
-        devices_json = json.loads(devices_result.stdout.decode("utf-8"))
-        
-        for runtime_id, devices in devices_json["devices"].items():
-            if "iOS" in runtime_id:
-                runtime_ios_version = runtime_id.split("iOS-")[-1].replace("-", ".")
-                
-                # Skip if iOS version is specified but doesn't match
-                if ios_version and runtime_ios_version != ios_version:
-                    continue
-                    
-                for device in devices:
-                    if device["isAvailable"]:
-                        # Skip if simulator name is specified but doesn't match
-                        if simulator_name and device["name"] != simulator_name:
-                            continue
-                        
-                        return f'platform=iOS Simulator,name={device["name"]},OS={runtime_ios_version}'
+        destination = (await _simctl_devices()).get((simulator_name or None, ios_version or None))
+        if destination:
+            return destination
         
         # If no matching simulator found, raise an error
         criteria = []
@@ -169,7 +571,7 @@ def build_destination(simulator_name: Optional[str] = None, ios_version: Optiona
         raise ValueError(f"No available simulator found matching criteria: {', '.join(criteria)}")
     else:
         # Use auto-detection (existing behavior)
-        return find_available_simulator()
+        return await find_available_simulator()
 class BuildParams(BaseModel):
     """Parameters"""
     folder: Annotated[str, Field(description="The full path of the current folder that the iOS Xcode workspace/project sits")]
@@ -190,106 +592,145 @@ class SchemeConfig(BaseModel):
 
 server = Server("build")
 
+# Tool schemas never change, so build the tool list once at import
+_BUILD_SCHEMA = BuildParams.model_json_schema()
+_FOLDER_SCHEMA = Folder.model_json_schema()
+_SCHEME_SCHEMA = SchemeConfig.model_json_schema()
+
+_TOOLS_LIST = [
+    Tool(
+        name = "build",
+        description = "Build the iOS Xcode workspace/project in the folder",
+        inputSchema = _BUILD_SCHEMA,
+    ),
+    Tool(
+        name="test",
+        description="Run test for the iOS Xcode workspace/project in the folder (this also builds, no need to call build first)",
+        inputSchema=_BUILD_SCHEMA,
+    ),
+    Tool(
+        name="build_for_testing",
+        description="Build the iOS Xcode workspace/project in the folder along with its test bundles, without running the tests",
+        inputSchema=_BUILD_SCHEMA,
+    ),
+    Tool(
+        name="test_without_building",
+        description="Run test for the iOS Xcode workspace/project in the folder, reusing the products of a previous build_for_testing",
+        inputSchema=_BUILD_SCHEMA,
+    ),
+    Tool(
+        name="list_schemes",
+        description="List all available schemes for the iOS Xcode workspace/project in the folder",
+        inputSchema=_FOLDER_SCHEMA,
+    ),
+    Tool(
+        name="set_default_scheme",
+        description="Set a default scheme to use for future builds and tests (avoids having to specify scheme each time)",
+        inputSchema=_SCHEME_SCHEMA,
+    ),
+    Tool(
+        name="get_default_scheme",
+        description="Show the currently configured default scheme",
+        inputSchema={"type": "object"},
+    ),
+    Tool(
+        name="clear_cache",
+        description="Forget cached simulators, schemes and project locations (use after adding a simulator or scheme)",
+        inputSchema={"type": "object"},
+    )
+]
+
 @server.list_tools()
 async def list_tools() -> list[Tool]:
-    return [
-        Tool(
-            name = "build",
-            description = "Build the iOS Xcode workspace/project in the folder",
-            inputSchema = BuildParams.model_json_schema(),
-        ),
-        Tool(
-            name="test",
-            description="Run test for the iOS Xcode workspace/project in the folder",
-            inputSchema=BuildParams.model_json_schema(),
-        ),
-        Tool(
-            name="list_schemes",
-            description="List all available schemes for the iOS Xcode workspace/project in the folder",
-            inputSchema=Folder.model_json_schema(),
-        ),
-        Tool(
-            name="set_default_scheme",
-            description="Set a default scheme to use for future builds and tests (avoids having to specify scheme each time)",
-            inputSchema=SchemeConfig.model_json_schema(),
-        ),
-        Tool(
-            name="get_default_scheme",
-            description="Show the currently configured default scheme",
-            inputSchema={"type": "object"},
-        )
-    ]
-@server.call_tool()
-async def call_tool(name, arguments: dict) -> list[TextContent]:
+    return _TOOLS_LIST
+
+def _parse_arguments[T: BaseModel](model: type[T], arguments: dict) -> T:
+    try:
+        return model(**arguments)
+    except ValueError as e:
+        raise McpError(ErrorData(code=INVALID_PARAMS, message=str(e)))
+
+async def _handle_set_default_scheme(name: str, arguments: dict) -> list[TextContent]:
     global default_scheme
+    args = _parse_arguments(SchemeConfig, arguments)
+    project = _resolve_project(args.folder)
+    if not project:
+        return [TextContent(type="text", text="No Xcode project found in the specified folder")]
+    xcode_project_path, _, project_type = project
     
-    if name == "set_default_scheme":
-        try:
-            args = SchemeConfig(**arguments)
-        except ValueError as e:
-            raise McpError(ErrorData(code=INVALID_PARAMS, message=str(e)))
-        os.chdir(args.folder)
-        xcode_project_path = find_xcode_project()
-        if not xcode_project_path:
-            return [TextContent(type="text", text="No Xcode project found in the specified folder")]
-        
-        project_name = os.path.basename(xcode_project_path)
-        project_type = "-workspace" if xcode_project_path.endswith(".xcworkspace") else "-project"
-        
-        # Validate that the scheme exists
-        available_schemes = get_available_schemes(project_type, project_name)
-        if args.scheme not in available_schemes:
-            return [TextContent(type="text", text=f"Scheme '{args.scheme}' not found. Available schemes: {', '.join(available_schemes)}")]
-        
-        # Set the default scheme
-        default_scheme = args.scheme
-        return [TextContent(type="text", text=f"Default scheme set to '{args.scheme}'. Future builds and tests will use this scheme unless explicitly overridden.")]
-    
-    if name == "get_default_scheme":
-        if default_scheme:
-            return [TextContent(type="text", text=f"Current default scheme: '{default_scheme}'")]
-        else:
-            return [TextContent(type="text", text="No default scheme configured. Builds will use the first available scheme.")]
+    # Validate that the scheme exists
+    available_schemes = await missing_scheme(project_type, xcode_project_path, args.scheme)
+    if available_schemes is not None:
+        return [TextContent(type="text", text=f"Scheme '{args.scheme}' not found. Available schemes: {', '.join(available_schemes)}")]
     
-    if name == "list_schemes":
-        try:
-            args = Folder(**arguments)
-        except ValueError as e:
-            raise McpError(ErrorData(code=INVALID_PARAMS, message=str(e)))
-        os.chdir(args.folder)
-        xcode_project_path = find_xcode_project()
-        if not xcode_project_path:
-            return [TextContent(type="text", text="No Xcode project found in the specified folder")]
-        
-        project_name = os.path.basename(xcode_project_path)
-        project_type = "-workspace" if xcode_project_path.endswith(".xcworkspace") else "-project"
-        
-        schemes = get_available_schemes(project_type, project_name)
-        if schemes:
-            return [TextContent(type="text", text="Available schemes:\n" + "\n".join(f"- {scheme}" for scheme in schemes))]
-        else:
-            return [TextContent(type="text", text="No schemes found")]
+    # Set the default scheme
+    default_scheme = args.scheme
+    return [TextContent(type="text", text=f"Default scheme set to '{args.scheme}'. Future builds and tests will use this scheme unless explicitly overridden.")]
+
+async def _handle_get_default_scheme(name: str, arguments: dict) -> list[TextContent]:
+    if default_scheme:
+        return [TextContent(type="text", text=f"Current default scheme: '{default_scheme}'")]
+    else:
+        return [TextContent(type="text", text="No default scheme configured. Builds will use the first available scheme.")]
+
+async def _handle_clear_cache(name: str, arguments: dict) -> list[TextContent]:
+    clear_caches()
+    return [TextContent(type="text", text="Cleared cached simulators, schemes and project locations")]
+
+async def _handle_list_schemes(name: str, arguments: dict) -> list[TextContent]:
+    args = _parse_arguments(Folder, arguments)
+    project = _resolve_project(args.folder)
+    if not project:
+        return [TextContent(type="text", text="No Xcode project found in the specified folder")]
+    xcode_project_path, _, project_type = project
     
+    schemes = await get_available_schemes(project_type, xcode_project_path)
+    if schemes:
+        return [TextContent(type="text", text="Available schemes:\n" + "\n".join(f"- {scheme}" for scheme in schemes))]
+    else:
+        return [TextContent(type="text", text="No schemes found")]
+
+# xcodebuild action for each build tool, a plain build needs none
+_XCODEBUILD_ACTIONS = {
+    "test": "test",
+    "build_for_testing": "build-for-testing",
+    "test_without_building": "test-without-building",
+}
+
+def _derived_data_flags(folder: str) -> list[str]:
+    """Flags pinning DerivedData and cloned packages to a stable per-folder cache"""
+    if not _PIN_DERIVED_DATA:
+        return []
+    cache_root = os.path.join(_CACHE_DIR, hashlib.sha1(os.path.abspath(folder).encode()).hexdigest()[:12])
+    derived_data_path = os.path.join(cache_root, "DerivedData")
+    packages_path = os.path.join(cache_root, "SourcePackages")
     try:
-        args = BuildParams(**arguments)
-    except ValueError as e:
-        raise McpError(ErrorData(code=INVALID_PARAMS, message=str(e)))
+        os.makedirs(derived_data_path, exist_ok=True)
+        os.makedirs(packages_path, exist_ok=True)
+    except OSError:
+        # e.g. a read-only home directory, build with xcodebuild's default locations instead
+        return []
+    return ["-derivedDataPath", derived_data_path, "-clonedSourcePackagesDirPath", packages_path]
+
+async def _handle_build(name: str, arguments: dict) -> list[TextContent]:
+    """Handles the build, test, build_for_testing and test_without_building tools"""
+    args = _parse_arguments(BuildParams, arguments)
     
     # Validate filter_string requirement for string_match filter
     if args.output_filter == OutputFilter.STRING_MATCH and not args.filter_string:
         raise McpError(ErrorData(code=INVALID_PARAMS, message="filter_string is required when output_filter is 'string_match'"))
     
-    os.chdir(args.folder)
-    xcode_project_path = find_xcode_project()
-    if not xcode_project_path:
+    project = _resolve_project(args.folder)
+    if not project:
         return [TextContent(type="text", text="No Xcode project found in the specified folder")]
-    
-    project_name = os.path.basename(xcode_project_path)
-    project_type = "-workspace" if xcode_project_path.endswith(".xcworkspace") else "-project"
+    xcode_project_path, project_name, project_type = project
 
     try:
-        scheme = find_scheme(project_type, project_name, args.scheme)
-        destination = build_destination(args.simulator_name, args.ios_version)
+        # Scheme listing and simulator lookup are independent subprocess calls, run them side by side
+        scheme, destination = await asyncio.gather(
+            find_scheme(project_type, xcode_project_path, args.scheme),
+            build_destination(args.simulator_name, args.ios_version),
+        )
     except ValueError as e:
         raise McpError(ErrorData(code=INVALID_PARAMS, message=str(e)))
     command = ["xcodebuild",
@@ -298,28 +739,48 @@ async def call_tool(name, arguments: dict) -> list[TextContent]:
                "-scheme",
                scheme,
                "-destination",
-               destination]
-    if name == "test":
-        command.append("test")
+               destination,
+               *_PARALLEL_FLAGS,
+               *_derived_data_flags(args.folder)]
+    if name in _XCODEBUILD_ACTIONS:
+        command.append(_XCODEBUILD_ACTIONS[name])
 
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
-    
-    # Combine stdout and stderr for complete output
-    stdout_lines = result.stdout.decode("utf-8").splitlines()
-    stderr_lines = result.stderr.decode("utf-8").splitlines()
-    all_lines = stdout_lines + stderr_lines
-    
-    filtered_output = filter_build_output(all_lines, args.output_filter, args.filter_string)
+    returncode, filtered_output, unknown_scheme = await run_xcodebuild(command, args.folder, args.output_filter, args.filter_string)
     
     # Include build status information
-    status_text = f"Build {'succeeded' if result.returncode == 0 else 'failed'} (exit code: {result.returncode})"
+    status_text = f"Build {'succeeded' if returncode == 0 else 'failed'} (exit code: {returncode})"
     
-    return [
-        TextContent(type="text", text=f"Command: {' '.join(command)}"),
+    result = [
+        TextContent(type="text", text=f"Command: {shlex.join(command)}"),
         TextContent(type="text", text=status_text),
         TextContent(type="text", text=filtered_output)
         ]
 
+    # The scheme wasn't validated up front, point out the alternatives when xcodebuild didn't know it
+    if returncode != 0 and scheme and unknown_scheme:
+        available_schemes = await missing_scheme(project_type, xcode_project_path, scheme)
+        if available_schemes:
+            result.append(TextContent(type="text", text=f"Scheme '{scheme}' not found. Available schemes: {', '.join(available_schemes)}"))
+    return result
+
+_HANDLERS = {
+    "build": _handle_build,
+    "test": _handle_build,
+    "build_for_testing": _handle_build,
+    "test_without_building": _handle_build,
+    "list_schemes": _handle_list_schemes,
+    "set_default_scheme": _handle_set_default_scheme,
+    "get_default_scheme": _handle_get_default_scheme,
+    "clear_cache": _handle_clear_cache,
+}
+
+@server.call_tool()
+async def call_tool(name, arguments: dict) -> list[TextContent]:
+    handler = _HANDLERS.get(name)
+    if not handler:
+        raise McpError(ErrorData(code=INVALID_PARAMS, message=f"Unknown tool: {name}"))
+    return await handler(name, arguments)
+
 
 async def run():
     options = server.create_initialization_options()
@@ -332,5 +793,4 @@ async def run():
         )
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(run())